@@ -0,0 +1,325 @@
+# bench_ingest.py - Reproducible benchmark for OCR, chunking and embedding
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+
+import chromadb
+import psutil
+import pytesseract
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from data_processing import (
+    PDF_DPI,
+    convert_traditional_to_simplified,
+    filter_watermark_text,
+    pdf_to_images,
+    preprocess_image_for_ocr,
+)
+from embed_store import MODEL_NAME, chunk_text, hnsw_metadata
+
+DEFAULT_PAGE_COUNTS = [1, 5, 10]
+DEFAULT_LANGUAGE = "chi_sim+eng"
+WATERMARK_TEXT = "内部资料 CONFIDENTIAL"
+
+# Fonts that can render Chinese on common Linux and macOS installs
+CJK_FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+]
+
+SENTENCES = [
+    "价值交换是所有关系的基础，先想清楚自己能提供什么。",
+    "翻盘的关键在于复盘，找到真正的问题再行动。",
+    "情绪稳定是一种能力，需要长期练习。",
+    "不要用别人的标准来衡量自己的人生。",
+    "职业选择要看长期成长空间，而不是眼前的收入。",
+    "沟通时先表达感受，再提出具体的请求。",
+    "边界感让关系更健康，也让自己更轻松。",
+    "Set clear goals and review your progress every week.",
+    "Good decisions come from honest feedback and patience.",
+    "Invest in skills that compound over many years.",
+]
+
+def find_cjk_font(path=None):
+    """Return a font path that can render Chinese, or raise if none is installed."""
+    candidates = [path] if path else CJK_FONT_CANDIDATES
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError("No CJK font found; install fonts-noto-cjk or pass --font")
+
+def page_text(rng, lines_per_page=18):
+    """Random but seeded page of Chinese and English sentences."""
+    return [rng.choice(SENTENCES) for _ in range(lines_per_page)]
+
+def render_page(lines, font, watermark_font, rng):
+    """Render text lines onto an A4 page at PDF_DPI with a rotated watermark and scan noise."""
+    width, height = int(8.27 * PDF_DPI), int(11.69 * PDF_DPI)
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+
+    margin = int(0.8 * PDF_DPI)
+    line_height = int(font.size * 1.8)
+    for i, line in enumerate(lines):
+        draw.text((margin, margin + i * line_height), line, font=font, fill=0)
+
+    # Tiled, rotated light-grey watermark like the ones on the lecture notes
+    mark = Image.new("L", (width, height), 0)
+    mark_draw = ImageDraw.Draw(mark)
+    step = int(2.5 * PDF_DPI)
+    for y in range(0, height, step):
+        for x in range(0, width, step):
+            mark_draw.text((x, y), WATERMARK_TEXT, font=watermark_font, fill=255)
+    mark = mark.rotate(30, fillcolor=0)
+    page.paste(Image.new("L", (width, height), 190), (0, 0), mark.point(lambda v: v // 3))
+
+    # Scanner noise: slight blur and a little salt-and-pepper
+    page = page.filter(ImageFilter.GaussianBlur(0.6))
+    pixels = page.load()
+    for _ in range(width * height // 2000):
+        pixels[rng.randrange(width), rng.randrange(height)] = rng.choice((0, 255))
+    return page.convert("RGB")
+
+def make_synthetic_pdf(path, num_pages, font_path, seed):
+    """Write a scanned-looking PDF and return the ground-truth text per page."""
+    rng = random.Random(seed)
+    font = ImageFont.truetype(font_path, int(PDF_DPI * 0.17))
+    watermark_font = ImageFont.truetype(font_path, int(PDF_DPI * 0.35))
+
+    truths = []
+    pages = []
+    for _ in range(num_pages):
+        lines = page_text(rng)
+        truths.append("\n".join(lines))
+        pages.append(render_page(lines, font, watermark_font, rng))
+
+    pages[0].save(path, save_all=True, append_images=pages[1:], resolution=PDF_DPI)
+    return truths
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def char_accuracy(ocr_text, truth):
+    """1 - CER, ignoring whitespace, floored at 0."""
+    ocr_chars = "".join(ocr_text.split())
+    truth_chars = "".join(truth.split())
+    if not truth_chars:
+        return 1.0
+    return max(0.0, 1 - edit_distance(ocr_chars, truth_chars) / len(truth_chars))
+
+RSS_SAMPLE_INTERVAL = 0.01  # Seconds between RSS samples while a stage runs
+
+def rss_mb(process):
+    """Resident memory of a process plus its children (tesseract runs as a subprocess)."""
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            pass  # Child exited between listing and sampling
+    return rss / (1024 * 1024)
+
+class StageTimer:
+    """
+    Accumulate wall time per stage and, with track_rss, the peak RSS growth during each one.
+
+    RSS is sampled in a background thread while the stage runs and reported as
+    the peak above the RSS at the stage's start, so memory already held (e.g. the
+    embedding model or earlier runs) does not count against later stages.
+    Listing child processes scans /proc in Python while holding the GIL, so
+    the sampler slows the stages it watches: take timings from a run without it.
+    """
+
+    def __init__(self, track_rss=False):
+        self.process = psutil.Process()
+        self.track_rss = track_rss
+        self.seconds = {}
+        self.peak_rss_delta_mb = {}
+
+    def time(self, stage, fn, *args, **kwargs):
+        if not self.track_rss:
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+            return result
+
+        baseline = rss_mb(self.process)
+        peak = [baseline]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(RSS_SAMPLE_INTERVAL):
+                peak[0] = max(peak[0], rss_mb(self.process))
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            done.set()
+            sampler.join()
+        peak[0] = max(peak[0], rss_mb(self.process))
+
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+        delta = round(peak[0] - baseline, 1)
+        self.peak_rss_delta_mb[stage] = max(self.peak_rss_delta_mb.get(stage, 0.0), delta)
+        return result
+
+def bench_document(pdf_path, truths, language, embedder, work_dir, track_rss=False):
+    """Run every ingestion stage on one PDF and return its timings and accuracy (or, with track_rss, its memory use)."""
+    timer = StageTimer(track_rss)
+    baseline_rss = rss_mb(timer.process)
+    pages = timer.time("pdf_to_images", pdf_to_images, pdf_path)
+
+    texts = []
+    accuracies = []
+    for page, truth in zip(pages, truths):
+        processed = timer.time("preprocess", preprocess_image_for_ocr, page)
+        raw = timer.time("tesseract", pytesseract.image_to_string, processed, lang=language)
+        filtered = timer.time("filter_watermark", filter_watermark_text, raw)
+        text = timer.time("t2s", convert_traditional_to_simplified, filtered)
+        texts.append(text)
+        accuracies.append(char_accuracy(text, truth))
+
+    full_text = "".join(f"\n--- Page {i+1} ---\n{text}\n" for i, text in enumerate(texts))
+    chunks = timer.time("chunk_text", chunk_text, full_text)
+
+    embeddings = timer.time("embed", embedder.encode, chunks) if chunks else []
+
+    client = chromadb.PersistentClient(path=os.path.join(work_dir, "chroma"))
+    collection = client.get_or_create_collection(name="bench", metadata=hnsw_metadata())
+    if chunks:
+        timer.time(
+            "store", collection.add,
+            documents=chunks,
+            ids=[f"chunk-{i}" for i in range(len(chunks))],
+            embeddings=[emb.tolist() for emb in embeddings]
+        )
+
+    if track_rss:
+        return {
+            "baseline_rss_mb": round(baseline_rss, 1),
+            "peak_rss_delta_mb": timer.peak_rss_delta_mb,
+        }
+
+    num_pages = len(pages)
+    num_chunks = len(chunks)
+    page_stages = ("pdf_to_images", "preprocess", "tesseract", "filter_watermark", "t2s")
+    chunk_stages = ("chunk_text", "embed", "store")
+    return {
+        "pages": num_pages,
+        "chunks": num_chunks,
+        "seconds": {stage: round(value, 4) for stage, value in timer.seconds.items()},
+        "ms_per_page": {
+            stage: round(timer.seconds[stage] * 1000 / num_pages, 2)
+            for stage in page_stages if stage in timer.seconds
+        },
+        "ms_per_chunk": {
+            stage: round(timer.seconds[stage] * 1000 / num_chunks, 2)
+            for stage in chunk_stages if stage in timer.seconds and num_chunks
+        },
+        "ocr_char_accuracy": {
+            "mean": round(sum(accuracies) / len(accuracies), 4),
+            "min": round(min(accuracies), 4),
+        },
+    }
+
+def environment_info():
+    """Metadata needed to compare runs across commits and machines."""
+    def run(cmd):
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True).stdout.strip().splitlines()[0]
+        except (OSError, IndexError):
+            return None
+
+    return {
+        "commit": run(["git", "rev-parse", "HEAD"]),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "tesseract": run(["tesseract", "--version"]),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR, chunking and embedding on synthetic scanned PDFs")
+    parser.add_argument("--pages", default=",".join(map(str, DEFAULT_PAGE_COUNTS)),
+                        help="Comma-separated page counts, one synthetic PDF each")
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE, help="Tesseract language code")
+    parser.add_argument("--font", help="Font file able to render Chinese")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_ingest.json", help="Where to write the JSON results")
+    parser.add_argument("--no_memory", action="store_true", help="Skip the separate pass that measures RSS per stage")
+    args = parser.parse_args()
+
+    page_counts = [int(v) for v in args.pages.split(",") if v]
+    font_path = find_cjk_font(args.font)
+
+    print("🤖 Loading embedding model...")
+    start = time.perf_counter()
+    from sentence_transformers import SentenceTransformer
+    embedder = SentenceTransformer(MODEL_NAME)
+    model_load_seconds = time.perf_counter() - start
+
+    results = {
+        "environment": environment_info(),
+        "config": {
+            "pages": page_counts,
+            "language": args.language,
+            "font": os.path.basename(font_path),
+            "seed": args.seed,
+            "dpi": PDF_DPI,
+            "embedding_model": MODEL_NAME,
+        },
+        "model_load_seconds": round(model_load_seconds, 3),
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as work_dir:
+        for num_pages in page_counts:
+            pdf_path = os.path.join(work_dir, f"synthetic_{num_pages}p.pdf")
+            print(f"📄 Generating {num_pages}-page synthetic PDF...")
+            truths = make_synthetic_pdf(pdf_path, num_pages, font_path, seed=args.seed + num_pages)
+
+            print(f"⏱️ Benchmarking {num_pages} pages...")
+            run = bench_document(pdf_path, truths, args.language, embedder, os.path.join(work_dir, str(num_pages)))
+            if not args.no_memory:
+                # Separate pass: the RSS sampler would slow the timed stages
+                print(f"📈 Measuring memory for {num_pages} pages...")
+                run.update(bench_document(
+                    pdf_path, truths, args.language, embedder,
+                    os.path.join(work_dir, f"{num_pages}-rss"), track_rss=True
+                ))
+            results["runs"].append(run)
+            print(f"   tesseract {run['ms_per_page'].get('tesseract', 0):.0f} ms/page, "
+                  f"embed {run['ms_per_chunk'].get('embed', 0):.1f} ms/chunk, "
+                  f"OCR accuracy {run['ocr_char_accuracy']['mean']:.1%}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✅ Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
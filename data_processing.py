@@ -6,6 +6,10 @@ from PIL import Image, ImageEnhance, ImageFilter
 import re
 from opencc import OpenCC
 
+# PDF rasterization settings used for OCR
+PDF_DPI = 200
+PDF_JPEG_QUALITY = 85
+
 # Initialize OpenCC converter for Traditional to Simplified Chinese
 cc = OpenCC('t2s')  # t2s = Traditional to Simplified
 
@@ -69,6 +73,10 @@ def filter_watermark_text(text):
     
     return '\n'.join(filtered_lines)
 
+def pdf_to_images(pdf_path):
+    """Render every PDF page to a PIL image for OCR."""
+    return convert_from_path(pdf_path, dpi=PDF_DPI, fmt='jpeg', jpegopt={'quality': PDF_JPEG_QUALITY})
+
 def process_pdf(pdf_path, output_path="output_notes.txt", language='chi_sim', max_pages=None):
     """
     Process a PDF file and extract text using OCR with watermark filtering.
@@ -89,7 +97,7 @@ def process_pdf(pdf_path, output_path="output_notes.txt", language='chi_sim', ma
             
         # Convert PDF pages to images with optimized settings
         print("Converting PDF to images...")
-        pages = convert_from_path(pdf_path, dpi=200, fmt='jpeg', jpegopt={'quality': 85})
+        pages = pdf_to_images(pdf_path)
         print(f"Found {len(pages)} pages")
         
         # Limit pages if specified
@@ -1,15 +1,90 @@
 # embed_store.py
-from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 import os
 import re
+from lexical_index import INDEX_PATH, LexicalIndex
+from sharding import (
+    NUM_SHARDS,
+    SHARD_BY,
+    layout_metadata,
+    layout_shard_names,
+    list_shard_names,
+    shard_for,
+    shard_name,
+    source_key,
+    stored_layout,
+)
 
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 100
 DB_DIR = "./chroma_store"
 MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 
+# HNSW index parameters (Chroma defaults); use tune_hnsw.py to pick an operating point
+HNSW_SPACE = "cosine"
+HNSW_CONSTRUCTION_EF = 100  # Candidate list size while building: higher = better graph, slower build
+HNSW_SEARCH_EF = 100  # Candidate list size while querying: higher = better recall, slower queries
+HNSW_M = 16  # Graph neighbours per node: higher = better recall, more memory
+
+def hnsw_metadata(space=HNSW_SPACE, construction_ef=HNSW_CONSTRUCTION_EF, search_ef=HNSW_SEARCH_EF, m=HNSW_M):
+    """Collection metadata that configures Chroma's HNSW index."""
+    return {
+        "hnsw:space": space,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+        "hnsw:M": m
+    }
+
+# Values Chroma uses when a collection was created without explicit HNSW metadata
+CHROMA_HNSW_DEFAULTS = {"hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 100}
+
+def current_search_ef(collection):
+    """search_ef a collection is using, from its configuration if available, else its metadata."""
+    try:
+        ef = (collection.configuration or {}).get("hnsw", {}).get("ef_search")
+        if ef is not None:
+            return ef
+    except AttributeError:
+        pass
+    return (collection.metadata or {}).get("hnsw:search_ef", CHROMA_HNSW_DEFAULTS["hnsw:search_ef"])
+
+def set_search_ef(collection, search_ef):
+    """
+    Change a collection's search_ef in place; unlike M and construction_ef it needs no rebuild.
+    
+    The stored configuration changes at once, but an index already loaded by a
+    client keeps its old value until the collection is opened again.
+    """
+    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+
+def apply_hnsw_settings(collection):
+    """
+    Bring an existing collection in line with the HNSW_* settings.
+    
+    search_ef can be changed in place. M and construction_ef only take effect
+    when the index is built, so a mismatch is reported: drop the collection
+    (drop_shard) and re-ingest to apply them.
+    """
+    wanted = hnsw_metadata()
+    current = collection.metadata or {}
+    
+    mismatched = [
+        f"{key[5:]}={current.get(key, CHROMA_HNSW_DEFAULTS[key])} (configured {wanted[key]})"
+        for key in ("hnsw:M", "hnsw:construction_ef")
+        if current.get(key, CHROMA_HNSW_DEFAULTS[key]) != wanted[key]
+    ]
+    if mismatched:
+        print(f"⚠️ {collection.name} was built with {', '.join(mismatched)}. "
+              f"These only apply when the index is built: run drop_shard() for it and re-run embed_store.py")
+    
+    if current_search_ef(collection) != HNSW_SEARCH_EF:
+        try:
+            set_search_ef(collection, HNSW_SEARCH_EF)
+            print(f"🔧 {collection.name}: search_ef set to {HNSW_SEARCH_EF}")
+        except Exception as e:
+            print(f"⚠️ Could not update search_ef on {collection.name}: {e}")
+
 def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     """Split text into overlapping chunks."""
     # Split by pages first, then by sentences for better chunking
@@ -49,8 +124,36 @@ def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     
     return chunks
 
-def embed_and_store(filepath: str):
-    """Embed and store text chunks in ChromaDB."""
+def resolve_layout(client, num_shards=None, shard_by=None):
+    """
+    Shard layout to write with: the one recorded in the store, else the arguments or NUM_SHARDS/SHARD_BY.
+    
+    A store keeps one layout so queries know which collections to search;
+    asking for a different one raises instead of silently mixing layouts.
+    """
+    layout = stored_layout(client)
+    if layout is None:
+        return num_shards or NUM_SHARDS, shard_by or SHARD_BY
+    
+    stored_shards, stored_by = layout
+    if num_shards is not None and num_shards != stored_shards:
+        raise ValueError(f"{DB_DIR} is sharded {stored_shards} ways; delete it and re-ingest every source to use {num_shards}")
+    if shard_by is not None and stored_shards > 1 and shard_by != stored_by:
+        raise ValueError(f"{DB_DIR} is sharded by {stored_by!r}; delete it and re-ingest every source to shard by {shard_by!r}")
+    return layout
+
+def embed_and_store(filepath: str, num_shards: int = None, shard_by: str = None, only_shards=None):
+    """
+    Embed and store text chunks in ChromaDB.
+    
+    Args:
+        filepath (str): Path to the text file to embed
+        num_shards (int): Number of collections to spread the corpus over (1 = single "notes");
+            only for a new store, defaults to the store's layout or NUM_SHARDS
+        shard_by (str): "source" keeps a document in one shard, "hash" spreads its chunks;
+            only for a new store, defaults to the store's layout or SHARD_BY
+        only_shards (set): Shard indexes to write (None for all), for rebuilding single shards
+    """
     print(f"📖 Reading text from {filepath}...")
     with open(filepath, "r", encoding="utf-8") as f:
         text = f.read()
@@ -59,47 +162,111 @@ def embed_and_store(filepath: str):
     chunks = chunk_text(text)
     print(f"📦 Created {len(chunks)} chunks")
 
-    print("🤖 Loading embedding model...")
-    embedder = SentenceTransformer(MODEL_NAME)
-    
-    print("🧮 Computing embeddings...")
-    embeddings = embedder.encode(chunks)
-
     print("🗄️ Initializing ChromaDB...")
     # Use the new ChromaDB API
     client = chromadb.PersistentClient(path=DB_DIR)
-    collection = client.get_or_create_collection(
-        name="notes",
-        metadata={"hnsw:space": "cosine"}
-    )
-
-    print("💾 Storing chunks in ChromaDB...")
-    # Prepare data for batch insertion
-    documents = []
-    ids = []
-    embeddings_list = []
-    metadatas = []
+    num_shards, shard_by = resolve_layout(client, num_shards, shard_by)
+
+    # Route each chunk to its shard before embedding so skipped shards cost nothing
+    routed = {}
+    for i, chunk in enumerate(chunks):
+        # Source-qualified so documents never collide and Chroma and the bigram index agree
+        chunk_id = f"{source_key(filepath)}-chunk-{i}"
+        shard = shard_for(filepath, chunk_id, num_shards, shard_by)
+        if only_shards is not None and shard not in only_shards:
+            continue
+        routed.setdefault(shard, []).append((i, chunk_id, chunk))
+    
+    # Bigram index for exact-term lookups, kept in step with the collections
+    lexical_index = LexicalIndex(INDEX_PATH)
+    
+    # Remove this source's old chunks first so a re-ingest (possibly with fewer
+    # chunks) or a shard rebuild leaves nothing stale behind, in Chroma and the
+    # bigram index alike. A full ingest clears every shard; a rebuild only its own.
+    existing = list_shard_names(client)
+    if only_shards is None:
+        targets = existing
+    else:
+        wanted = {shard_name(k, num_shards) for k in only_shards}
+        targets = [name for name in existing if name in wanted]
+    for name in targets:
+        client.get_collection(name).delete(where={"source": filepath})
+        lexical_index.remove_source(filepath, shards={name})
+    lexical_index.commit()
+    
+    if not routed:
+        print("⏭️ No chunks fall into the requested shards")
+        return
+
+    print("🤖 Loading embedding model...")
+    # Imported here so tune_hnsw.py and bench_ingest.py can use this module without torch
+    from sentence_transformers import SentenceTransformer
+    embedder = SentenceTransformer(MODEL_NAME)
     
-    for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-        documents.append(chunk)
-        ids.append(f"chunk-{i}")
-        embeddings_list.append(emb.tolist())
-        metadatas.append({
-            "source": filepath,
-            "chunk_id": i,
-            "chunk_size": len(chunk)
-        })
+    # Create every shard of the layout, even empty ones, so the store records its layout
+    collections = {}
+    for shard, name in enumerate(layout_shard_names(num_shards)):
+        collection = client.get_or_create_collection(
+            name=name,
+            metadata={**hnsw_metadata(), **layout_metadata(num_shards, shard_by)}
+        )
+        # get_or_create ignores the metadata when the collection already exists
+        apply_hnsw_settings(collection)
+        collections[shard] = collection
     
-    # Batch insert all chunks
-    collection.add(
-        documents=documents,
-        ids=ids,
-        embeddings=embeddings_list,
-        metadatas=metadatas
-    )
-
-    print(f"✅ Successfully stored {len(chunks)} chunks to ChromaDB at {DB_DIR}")
-    print(f"📊 Collection info: {collection.count()} documents")
+    stored = 0
+    for shard in sorted(routed):
+        entries = routed[shard]
+        name = shard_name(shard, num_shards)
+        collection = collections[shard]
+        
+        print(f"🧮 Computing embeddings for {name} ({len(entries)} chunks)...")
+        embeddings = embedder.encode([chunk for _, _, chunk in entries])
+
+        print(f"💾 Storing chunks in {name}...")
+        # Prepare data for batch insertion
+        documents = []
+        ids = []
+        embeddings_list = []
+        metadatas = []
+        
+        for (i, chunk_id, chunk), emb in zip(entries, embeddings):
+            documents.append(chunk)
+            ids.append(chunk_id)
+            embeddings_list.append(emb.tolist())
+            lexical_index.add(chunk_id, chunk, filepath, name)
+            metadatas.append({
+                "source": filepath,
+                "chunk_id": i,
+                "chunk_size": len(chunk)
+            })
+        
+        # Batch insert all chunks
+        collection.add(
+            documents=documents,
+            ids=ids,
+            embeddings=embeddings_list,
+            metadatas=metadatas
+        )
+        lexical_index.commit()
+        stored += len(entries)
+        print(f"📊 {name}: {collection.count()} documents")
+
+    print(f"✅ Successfully stored {stored} chunks to ChromaDB at {DB_DIR}")
+
+def drop_shard(index: int):
+    """Delete one shard's collection so it can be rebuilt with embed_and_store(only_shards={index})."""
+    client = chromadb.PersistentClient(path=DB_DIR)
+    layout = stored_layout(client)
+    name = shard_name(index, layout[0] if layout else NUM_SHARDS)
+    if name in list_shard_names(client):
+        client.delete_collection(name)
+        lexical_index = LexicalIndex(INDEX_PATH)
+        lexical_index.remove_shard(name)
+        lexical_index.commit()
+        print(f"🗑️ Dropped {name}")
+    else:
+        print(f"⚠️ Shard {name} does not exist")
 
 if __name__ == "__main__":
     embed_and_store("output_notes.txt")
\ No newline at end of file
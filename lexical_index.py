@@ -0,0 +1,252 @@
+# lexical_index.py - Character-bigram inverted index for exact-term lookups
+import math
+import re
+import sqlite3
+import threading
+
+INDEX_PATH = "./lexical_index.sqlite3"  # Kept next to ./chroma_store
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # Standard reciprocal-rank-fusion constant
+
+_WORD_RUN = re.compile(r"\w+")
+
+# Only postings are stored; chunk text lives in Chroma and is fetched by ID
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    shard TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    terms TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+CREATE INDEX IF NOT EXISTS docs_shard ON docs (shard);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    num_docs INTEGER NOT NULL,
+    total_length INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats VALUES (0, 0, 0);
+"""
+
+def tokenize(text):
+    """
+    Split text into lowercase character bigrams within runs of word characters.
+
+    Chinese has no spaces, so overlapping bigrams stand in for words: 价值交换 ->
+    价值, 值交, 交换. A run of a single character is kept as a unigram.
+    """
+    terms = []
+    for run in _WORD_RUN.findall(text.lower()):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+def contains_exact(text, query):
+    """Whether every word run of the query occurs verbatim (case-insensitive) in the text."""
+    runs = _WORD_RUN.findall(query.lower())
+    text = text.lower()
+    return bool(runs) and all(run in text for run in runs)
+
+def _placeholders(values):
+    return ",".join("?" * len(values))
+
+class LexicalIndex:
+    """
+    BM25 over character bigrams, stored in SQLite.
+
+    Writes go to the database as they happen and become visible to readers on
+    commit(), so an ingest only touches the rows of the chunks it changes.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._local = threading.local()  # One connection per thread; sqlite3 connections are not shared
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")  # Queries keep reading while embed_store.py writes
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._conn().execute("SELECT num_docs FROM stats").fetchone()[0]
+
+    def add(self, chunk_id, text, source, shard):
+        """Index one chunk, replacing any earlier version with the same ID."""
+        self.remove(chunk_id)
+        terms = tokenize(text)
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+
+        conn = self._conn()
+        # The chunk's distinct terms are kept so removing it needs only point deletes
+        doc = conn.execute(
+            "INSERT INTO docs (chunk_id, source, shard, length, terms) VALUES (?, ?, ?, ?, ?)",
+            (chunk_id, source, shard, len(terms), " ".join(counts))
+        ).lastrowid
+        # length is copied into each posting so BM25 can be scored from this table alone
+        conn.executemany(
+            "INSERT INTO postings VALUES (?, ?, ?, ?)",
+            [(term, doc, tf, len(terms)) for term, tf in counts.items()]
+        )
+        conn.executemany(
+            "INSERT INTO terms VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+            [(term,) for term in counts]
+        )
+        conn.execute("UPDATE stats SET num_docs = num_docs + 1, total_length = total_length + ?", (len(terms),))
+
+    def remove(self, chunk_id):
+        self._remove_where("chunk_id = ?", (chunk_id,))
+
+    def remove_source(self, source, shards=None):
+        """Drop a source's chunks (optionally only those in `shards`), mirroring the Chroma delete."""
+        if shards is None:
+            self._remove_where("source = ?", (source,))
+        else:
+            shards = list(shards)
+            self._remove_where(f"source = ? AND shard IN ({_placeholders(shards)})", (source, *shards))
+
+    def remove_shard(self, shard):
+        """Drop every chunk stored in one shard collection."""
+        self._remove_where("shard = ?", (shard,))
+
+    def _remove_where(self, condition, params):
+        conn = self._conn()
+        rows = conn.execute(f"SELECT doc, length, terms FROM docs WHERE {condition}", params).fetchall()
+        if not rows:
+            return
+        conn.executemany(
+            "DELETE FROM postings WHERE term = ? AND doc = ?",
+            [(term, doc) for doc, _, terms in rows for term in terms.split(" ")]
+        )
+        conn.executemany(
+            "UPDATE terms SET df = df - 1 WHERE term = ?",
+            [(term,) for _, _, terms in rows for term in terms.split(" ")]
+        )
+        conn.execute("DELETE FROM terms WHERE df = 0")
+        conn.executemany("DELETE FROM docs WHERE doc = ?", [(doc,) for doc, _, _ in rows])
+        conn.execute(
+            "UPDATE stats SET num_docs = num_docs - ?, total_length = total_length - ?",
+            (len(rows), sum(length for _, length, _ in rows))
+        )
+
+    def search(self, query, n_results=5, shards=None):
+        """
+        Return [(chunk_id, score, coverage)] ranked by BM25.
+
+        coverage is the fraction of the query's distinct terms found in the chunk.
+        If `shards` is given, only chunks stored in those collections are considered.
+        """
+        terms = sorted(set(tokenize(query)))
+        conn = self._conn()
+        num_docs, total_length = conn.execute("SELECT num_docs, total_length FROM stats").fetchone()
+        if not terms or not num_docs:
+            return []
+
+        doc_freqs = dict(conn.execute(
+            f"SELECT term, df FROM terms WHERE term IN ({_placeholders(terms)})", terms
+        ))
+        if not doc_freqs:
+            return []
+        idf_case = " ".join("WHEN ? THEN ?" for _ in doc_freqs)
+        idf_params = []
+        for term, df in doc_freqs.items():
+            idf_params += [term, math.log(1 + (num_docs - df + 0.5) / (df + 0.5))]
+
+        # Scored inside SQLite so the posting lists never pass through Python
+        sql = f"""
+            WITH scored AS (
+                SELECT doc,
+                       SUM((CASE term {idf_case} END) * tf * ? / (tf + ? * (1 - ? + ? * length / ?))) AS score,
+                       COUNT(*) AS matched
+                FROM postings
+                WHERE term IN ({_placeholders(doc_freqs)})
+                GROUP BY doc
+            )
+            SELECT d.chunk_id, s.score, s.matched FROM scored s JOIN docs d ON d.doc = s.doc
+        """
+        params = [*idf_params, BM25_K1 + 1, BM25_K1, BM25_B, BM25_B, total_length / num_docs, *doc_freqs]
+        if shards is not None:
+            shards = list(shards)
+            sql += f" WHERE d.shard IN ({_placeholders(shards)})"
+            params += shards
+        sql += " ORDER BY s.score DESC LIMIT ?"
+        params.append(n_results)
+        return [(chunk_id, score, matched / len(terms)) for chunk_id, score, matched in conn.execute(sql, params)]
+
+    def exact_candidates(self, query, n_results=5, shards=None):
+        """
+        Return up to n_results chunk IDs containing every bigram of the query.
+
+        Walks the rarest term's postings and stops as soon as n_results chunks
+        also hold the other terms, so a keyword lookup never scores the whole
+        posting lists. Candidates come in index order, not by relevance, and still
+        need a verbatim check against their text (see contains_exact).
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        conn = self._conn()
+        doc_freqs = dict(conn.execute(
+            f"SELECT term, df FROM terms WHERE term IN ({_placeholders(terms)})", terms
+        ))
+        if len(doc_freqs) < len(terms):
+            return []  # Some bigram occurs nowhere
+
+        rarest = min(terms, key=doc_freqs.get)
+        others = [term for term in terms if term != rarest]
+        sql = "SELECT d.chunk_id FROM postings p JOIN docs d ON d.doc = p.doc"
+        params = []
+        if shards is not None:
+            shards = list(shards)
+            sql += f" AND d.shard IN ({_placeholders(shards)})"
+            params += shards
+        sql += " WHERE p.term = ?"
+        params.append(rarest)
+        for term in others:
+            sql += " AND EXISTS (SELECT 1 FROM postings q WHERE q.doc = p.doc AND q.term = ?)"
+            params.append(term)
+        sql += " LIMIT ?"
+        params.append(n_results)
+        return [chunk_id for chunk_id, in conn.execute(sql, params)]
+
+    def shards(self, chunk_ids):
+        """Map chunk IDs to the collections they are stored in."""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return {}
+        return dict(self._conn().execute(
+            f"SELECT chunk_id, shard FROM docs WHERE chunk_id IN ({_placeholders(chunk_ids)})", chunk_ids
+        ))
+
+    def commit(self):
+        """Make the changes written so far visible to readers."""
+        self._conn().commit()
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several ranked lists of IDs into one, scoring each ID by sum(1 / (k + rank))."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,214 @@
+# load_test.py - Concurrent load generator for the retrieve-and-generate path
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from run_ollama_rag import stream_answer_with_ollama
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16]
+QUEUEING_FACTOR = 2.0  # TTFT p50 this many times the single-user baseline counts as queueing
+
+# (weight, question): mostly short keyword lookups, some longer open questions
+DEFAULT_QUESTIONS = [
+    (3, "翻盘"),
+    (3, "价值交换"),
+    (2, "如何提高自信？"),
+    (1, "工作和感情冲突的时候应该怎么选择？"),
+    (1, "怎样和父母沟通自己的职业规划，才能让他们理解并支持我？"),
+]
+
+# Used with --skip_retrieval so the tool runs without a chroma_store
+PLACEHOLDER_CHUNKS = ["价值交换是所有关系的基础，先想清楚自己能提供什么。" * 5] * 3
+
+def load_questions(path):
+    """Read 'weight<TAB>question' or plain 'question' lines."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            weight, sep, question = line.partition("\t")
+            if sep:
+                questions.append((float(weight), question))
+            else:
+                questions.append((1, line))
+    return questions
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def run_one(question, arrived, base_url, skip_retrieval, n_results):
+    """Retrieve and stream one answer; return timings measured from the arrival time."""
+    from query_rag import retrieve_relevant_chunks
+
+    started = time.perf_counter()
+    result = {"queue_wait": started - arrived, "ok": False}
+    try:
+        if skip_retrieval:
+            chunks = PLACEHOLDER_CHUNKS
+        else:
+            chunks = retrieve_relevant_chunks(question, n_results=n_results)
+        retrieved = time.perf_counter()
+        result["retrieval"] = retrieved - started
+
+        tokens = 0
+        for part in stream_answer_with_ollama(chunks, question, base_url=base_url):
+            if part.get("response") and "ttft" not in result:
+                result["ttft"] = time.perf_counter() - arrived
+            if part.get("done"):
+                tokens = part.get("eval_count", tokens)
+            elif part.get("response"):
+                tokens += 1
+        result["e2e"] = time.perf_counter() - arrived
+        result["tokens"] = tokens
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def run_level(concurrency, num_requests, rate, questions, base_url, skip_retrieval, n_results, rng):
+    """
+    Drive `num_requests` questions through `concurrency` workers.
+
+    With a rate, arrivals are Poisson (open loop) and latency includes time spent
+    waiting for a free worker; without one, every worker sends back-to-back (closed loop).
+    """
+    weights = [weight for weight, _ in questions]
+    texts = [text for _, text in questions]
+    picked = rng.choices(texts, weights=weights, k=num_requests)
+
+    results = []
+    lock = threading.Lock()
+
+    def task(question, arrived):
+        outcome = run_one(question, arrived, base_url, skip_retrieval, n_results)
+        with lock:
+            results.append(outcome)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="user") as pool:
+        if rate:
+            arrival = start
+            for question in picked:
+                arrival += rng.expovariate(rate)
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(task, question, arrival)
+        else:
+            pending = iter(picked)
+            pending_lock = threading.Lock()
+
+            def user():
+                while True:
+                    with pending_lock:
+                        question = next(pending, None)
+                    if question is None:
+                        return
+                    task(question, time.perf_counter())
+
+            for _ in range(concurrency):
+                pool.submit(user)
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    summary = {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "errors": num_requests - len(ok),
+        "duration_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "tokens_per_s": sum(r["tokens"] for r in ok) / elapsed if elapsed else 0.0,
+    }
+    for metric in ("ttft", "e2e", "retrieval", "queue_wait"):
+        values = [r[metric] for r in ok if metric in r]
+        for pct in (50, 95, 99):
+            summary[f"{metric}_p{pct}"] = percentile(values, pct)
+    if len(ok) < len(results):
+        summary["first_error"] = next(r["error"] for r in results if not r["ok"])
+    return summary
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+def print_report(summaries):
+    print(f"\n{'users':>5} {'ok':>5} {'err':>4} {'req/s':>7} {'tok/s':>7} "
+          f"{'TTFT p50':>9} {'p95':>6} {'p99':>6} {'E2E p50':>8} {'p95':>6} {'p99':>6}  (ms)")
+    print("-" * 90)
+    baseline = summaries[0].get("ttft_p50") if summaries else None
+    for s in summaries:
+        flag = ""
+        if baseline and s.get("ttft_p50") and s["ttft_p50"] > QUEUEING_FACTOR * baseline:
+            flag = "  ⚠️ queueing"
+        print(f"{s['concurrency']:>5} {s['requests'] - s['errors']:>5} {s['errors']:>4} "
+              f"{s['throughput_rps']:>7.2f} {s['tokens_per_s']:>7.1f} "
+              f"{format_ms(s['ttft_p50']):>9} {format_ms(s['ttft_p95']):>6} {format_ms(s['ttft_p99']):>6} "
+              f"{format_ms(s['e2e_p50']):>8} {format_ms(s['e2e_p95']):>6} {format_ms(s['e2e_p99']):>6}{flag}")
+        if "first_error" in s:
+            print(f"      ❌ {s['first_error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test retrieve-and-generate with many concurrent users")
+    parser.add_argument("--concurrency", default=",".join(map(str, DEFAULT_CONCURRENCY)),
+                        help="Comma-separated numbers of concurrent users to sweep")
+    parser.add_argument("--requests", type=int, default=50, help="Questions per concurrency level")
+    parser.add_argument("--rate", type=float, default=0.0, help="Poisson arrival rate in req/s (0 = closed loop)")
+    parser.add_argument("--questions", help="File of 'weight<TAB>question' lines")
+    parser.add_argument("--base_url", help="Ollama URL to target (default: start the bundled mock)")
+    parser.add_argument("--skip_retrieval", action="store_true", help="Use placeholder chunks instead of Chroma")
+    parser.add_argument("--n_results", type=int, default=3)
+    parser.add_argument("--token_latency_ms", type=float, default=30.0, help="Mock decode time per token")
+    parser.add_argument("--num_tokens", type=int, default=120, help="Mock tokens per answer")
+    parser.add_argument("--parallel", type=int, default=1, help="Mock requests decoded at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the summaries as JSON")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions) if args.questions else DEFAULT_QUESTIONS
+    levels = [int(v) for v in args.concurrency.split(",") if v]
+
+    base_url = args.base_url
+    if not base_url:
+        from mock_ollama import MockConfig, start_mock_server
+        config = MockConfig(
+            token_latency_ms=args.token_latency_ms,
+            num_tokens=args.num_tokens,
+            parallel=args.parallel,
+            seed=args.seed
+        )
+        _, base_url = start_mock_server(config)
+        print(f"🧪 Using mock Ollama at {base_url} ({args.parallel} parallel, "
+              f"{args.token_latency_ms:.0f} ms/token, {args.num_tokens} tokens)")
+
+    if not args.skip_retrieval:
+        print("🤖 Loading retriever...")
+        from query_rag import warmup
+        warmup()
+
+    rng = random.Random(args.seed)
+    summaries = []
+    for concurrency in levels:
+        print(f"⏱️ {concurrency} concurrent users, {args.requests} requests...")
+        summaries.append(run_level(
+            concurrency, args.requests, args.rate, questions, base_url,
+            args.skip_retrieval, args.n_results, rng
+        ))
+
+    print_report(summaries)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
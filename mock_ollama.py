@@ -0,0 +1,154 @@
+# mock_ollama.py - Local stand-in for Ollama's /api/tags and /api/generate, for load testing
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from setup_ollama import DEFAULT_MODEL
+
+DEFAULT_PORT = 11435  # One above Ollama's default so both can run side by side
+DEFAULT_MODELS = [DEFAULT_MODEL]
+
+MOCK_TOKENS = ["价值", "交换", "是", "关系", "的", "基础", "，", "先", "想", "清楚", "自己", "能", "提供", "什么", "。"]
+
+class MockConfig:
+    """Latency model for the mock server, roughly shaped like a single local GPU/CPU runner."""
+
+    def __init__(self, token_latency_ms=30.0, prefill_ms_per_char=0.2, num_tokens=120,
+                 parallel=1, jitter=0.1, models=None, seed=0):
+        self.token_latency_ms = token_latency_ms  # Decode time per generated token
+        self.prefill_ms_per_char = prefill_ms_per_char  # Prompt processing time per prompt character
+        self.num_tokens = num_tokens  # Tokens generated per request
+        self.parallel = parallel  # Requests decoded at once, like OLLAMA_NUM_PARALLEL; others wait
+        self.jitter = jitter  # Relative random variation applied to every sleep
+        self.models = models or DEFAULT_MODELS
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.slots = threading.Semaphore(parallel)
+
+    def sleep(self, ms):
+        with self.rng_lock:
+            factor = 1 + self.rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(ms * factor, 0) / 1000)
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None  # Set by make_server
+
+    def do_GET(self):
+        if self.path != "/api/tags":
+            self.send_error(404)
+            return
+        models = [{"name": name, "model": name, "size": 0} for name in self.config.models]
+        self._send_json({"models": models})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "")
+
+        if model not in self.config.models:
+            self._send_json({"error": f"model '{model}' not found"}, status=404)
+            return
+
+        prompt = request.get("prompt") or ""
+        if not prompt:
+            # Ollama treats a prompt-less generate as a load request
+            self._send_json({"model": model, "response": "", "done": True, "done_reason": "load"})
+            return
+
+        num_tokens = request.get("options", {}).get("num_predict", self.config.num_tokens)
+        stream = request.get("stream", True)
+
+        received = time.perf_counter()
+        with self.config.slots:
+            prefill_start = time.perf_counter()
+            self.config.sleep(len(prompt) * self.config.prefill_ms_per_char)
+            prefill = time.perf_counter() - prefill_start
+
+            decode_start = time.perf_counter()
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(num_tokens):
+                    if i:
+                        self.config.sleep(self.config.token_latency_ms)
+                    self._send_chunk({"model": model, "response": MOCK_TOKENS[i % len(MOCK_TOKENS)], "done": False})
+            else:
+                self.config.sleep(self.config.token_latency_ms * max(num_tokens - 1, 0))
+            decode = time.perf_counter() - decode_start
+
+        final = {
+            "model": model,
+            "response": "" if stream else "".join(MOCK_TOKENS[i % len(MOCK_TOKENS)] for i in range(num_tokens)),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - received) * 1e9),
+            "load_duration": 0,  # Time waiting for a slot shows up as total - prefill - eval
+            "prompt_eval_count": len(prompt) // 2,
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": num_tokens,
+            "eval_duration": int(decode * 1e9)
+        }
+        if stream:
+            self._send_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json(final)
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, body):
+        data = (json.dumps(body, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(config, host="127.0.0.1", port=DEFAULT_PORT):
+    """Create a threaded mock server bound to host:port (port 0 picks a free one)."""
+    handler = type("ConfiguredMockOllamaHandler", (MockOllamaHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_mock_server(config, host="127.0.0.1", port=0):
+    """Start the mock server in a daemon thread; return (server, base_url)."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server that streams fake tokens")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token_latency_ms", type=float, default=30.0)
+    parser.add_argument("--prefill_ms_per_char", type=float, default=0.2)
+    parser.add_argument("--num_tokens", type=int, default=120)
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    args = parser.parse_args()
+
+    config = MockConfig(args.token_latency_ms, args.prefill_ms_per_char, args.num_tokens, args.parallel, args.jitter)
+    server = make_server(config, port=args.port)
+    print(f"🧪 Mock Ollama listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,147 @@
 # query_rag.py
-import chromadb
-from sentence_transformers import SentenceTransformer
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import tracing
+from lexical_index import INDEX_PATH, LexicalIndex, contains_exact, reciprocal_rank_fusion
+from sharding import SEARCH_WORKERS, layout_shard_names, list_shard_names, merge_top_k, stored_layout
 
 DB_DIR = "./chroma_store"
 MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 
+# Retrieval mode for retrieve_relevant_chunks:
+#   "dense"         - embedding search only
+#   "hybrid"        - embedding + bigram search fused with reciprocal-rank fusion
+#   "lexical_first" - like hybrid, but skip the encoder when the bigram hits are confident
+RETRIEVAL_MODE = "hybrid"
+FUSION_CANDIDATES = 20  # Hits taken from each retriever before fusion
+LEXICAL_SHORTCUT_MAX_CHARS = 8  # Only short keyword queries may skip the encoder
+LEXICAL_SHORTCUT_OVERFETCH = 2  # Candidates checked per wanted result, since some fail the verbatim check
+
+# Heavy dependencies (chromadb, sentence_transformers -> torch) are imported
+# lazily so the run_* frontends can show their prompt before they are loaded.
+_embedder = None
+_collections = None
+_search_pool = None
+_lexical_index = None
+# Separate locks so a keyword query can use the bigram index (and Chroma) while
+# the encoder is still importing torch
+_embedder_lock = threading.Lock()
+_collections_lock = threading.Lock()
+_lexical_lock = threading.Lock()
+
+def get_embedder():
+    """Return the shared embedding model, loading it on first use."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                with tracing.span("embedder_load"):
+                    from sentence_transformers import SentenceTransformer
+                    _embedder = SentenceTransformer(MODEL_NAME)
+    return _embedder
+
+def get_collections():
+    """Return the shared ChromaDB collections (one per shard), opening them on first use."""
+    global _collections
+    if _collections is None:
+        with _collections_lock:
+            if _collections is None:
+                with tracing.span("collection_open"):
+                    import chromadb
+                    client = chromadb.PersistentClient(path=DB_DIR)
+                    # Search the layout embed_store.py recorded in the store, not NUM_SHARDS,
+                    # which only applies to a new store
+                    layout = stored_layout(client)
+                    if layout is None:
+                        raise RuntimeError(f"No notes collections found in {DB_DIR}. Run embed_store.py first.")
+                    existing = list_shard_names(client)
+                    names = [name for name in layout_shard_names(layout[0]) if name in existing]
+                    _collections = [client.get_collection(name) for name in names]
+    return _collections
+
+def get_lexical_index():
+    """Return the bigram index saved by embed_store.py, loading it on first use."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_lock:
+            if _lexical_index is None:
+                with tracing.span("lexical_index_load"):
+                    _lexical_index = LexicalIndex(INDEX_PATH)
+    return _lexical_index
+
+def search_collections(query_embeddings, n_results: int = 5):
+    """Query every shard in parallel and merge the hits into a global top-k by distance."""
+    global _search_pool
+    collections = get_collections()
+    
+    def _query(collection):
+        return collection.query(query_embeddings=query_embeddings, n_results=n_results)
+    
+    if len(collections) == 1:
+        return _query(collections[0])
+    
+    if _search_pool is None:
+        with _collections_lock:
+            if _search_pool is None:
+                _search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="shard-search")
+    
+    return merge_top_k(_search_pool.map(_query, collections), n_results)
+
+def warmup():
+    """Open the bigram index and collections, then load the embedding model, ahead of the first query."""
+    # Cheapest first, so lexical_first keyword queries are ready before the encoder
+    get_lexical_index()
+    get_collections()
+    get_embedder()
+
+def run_in_background(fn, name="background-load"):
+    """Run fn in a daemon thread and return a Future for its result.
+
+    Daemon threads keep 'quit' responsive even while a model is still loading.
+    """
+    future = Future()
+
+    def _run():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name=name, daemon=True).start()
+    return future
+
+def start_warmup(then=None):
+    """
+    Warm up the retriever in the background; the first query waits for it.
+    
+    `then` (e.g. an LLM loader) runs afterwards in the same thread, so torch and
+    transformers are never imported from two threads at once. The returned
+    Future holds its result.
+    """
+    def _run():
+        try:
+            warmup()
+        except Exception:
+            if then is None:
+                raise
+            # The first query retries the retriever and reports the error
+        return then() if then is not None else None
+    
+    return run_in_background(_run, name="rag-warmup")
+
 def query_notes(query: str, n_results: int = 5):
     """Query the ChromaDB for relevant notes."""
     print(f"🔍 Querying: '{query}'")
     
     # Load the embedding model
-    embedder = SentenceTransformer(MODEL_NAME)
-    
-    # Initialize ChromaDB client
-    client = chromadb.PersistentClient(path=DB_DIR)
-    collection = client.get_collection("notes")
+    embedder = get_embedder()
     
     # Generate query embedding
     query_embedding = embedder.encode([query])
     
-    # Search for similar documents
-    results = collection.query(
-        query_embeddings=query_embedding.tolist(),
-        n_results=n_results
-    )
+    # Search for similar documents across all shards
+    results = search_collections(query_embedding.tolist(), n_results)
     
     print(f"📊 Found {len(results['documents'][0])} relevant chunks:")
     print("=" * 80)
@@ -41,26 +158,83 @@ def query_notes(query: str, n_results: int = 5):
     
     return results
 
-def retrieve_relevant_chunks(query: str, n_results: int = 5):
+def fetch_documents(chunk_ids, lexical_index):
+    """Fetch chunk texts from Chroma by ID (the bigram index keeps no text); returns {chunk_id: text}."""
+    collections = {collection.name: collection for collection in get_collections()}
+    by_shard = {}
+    for chunk_id, shard in lexical_index.shards(chunk_ids).items():
+        if shard in collections:
+            by_shard.setdefault(shard, []).append(chunk_id)
+    
+    texts = {}
+    for shard, ids in by_shard.items():
+        data = collections[shard].get(ids=ids, include=["documents"])
+        texts.update(zip(data['ids'], data['documents']))
+    return texts
+
+def lexical_shortcut(query, n_results, lexical_index, shards):
+    """
+    Answer a short keyword query from the bigram index alone, or return None.
+
+    Succeeds when n_results chunks contain the query term verbatim. Full bigram
+    coverage alone is not enough: 价值…值交…交换 scattered across a chunk covers
+    every bigram of 价值交换, so candidates are checked against their text.
+    """
+    if len(query) > LEXICAL_SHORTCUT_MAX_CHARS:
+        return None
+    candidates = lexical_index.exact_candidates(query, LEXICAL_SHORTCUT_OVERFETCH * n_results, shards)
+    if len(candidates) < n_results:
+        return None
+    texts = fetch_documents(candidates, lexical_index)
+    verbatim = [texts[chunk_id] for chunk_id in candidates if contains_exact(texts.get(chunk_id, ""), query)]
+    return verbatim[:n_results] if len(verbatim) >= n_results else None
+
+def retrieve_relevant_chunks(query: str, n_results: int = 5, mode: str = None):
     """Retrieve relevant chunks for RAG without printing details."""
-    # Load the embedding model
-    embedder = SentenceTransformer(MODEL_NAME)
+    mode = mode or RETRIEVAL_MODE
+    lexical_index = get_lexical_index() if mode != "dense" else None
     
-    # Initialize ChromaDB client
-    client = chromadb.PersistentClient(path=DB_DIR)
-    collection = client.get_collection("notes")
+    # Exact-term lookup in the bigram index
+    lexical_hits = []
+    if lexical_index is not None and len(lexical_index):
+        shards = {collection.name for collection in get_collections()}
+        if mode == "lexical_first":
+            with tracing.span("lexical_shortcut"):
+                texts = lexical_shortcut(query, n_results, lexical_index, shards)
+            if texts is not None:
+                return texts
+        
+        with tracing.span("lexical_search"):
+            lexical_hits = lexical_index.search(query, max(FUSION_CANDIDATES, n_results), shards=shards)
+    
+    # Load the embedding model
+    embedder = get_embedder()
     
     # Generate query embedding
-    query_embedding = embedder.encode([query])
+    with tracing.span("query_encode"):
+        query_embedding = embedder.encode([query])
+    
+    # Search for similar documents across all shards
+    with tracing.span("vector_search"):
+        results = search_collections(
+            query_embedding.tolist(),
+            max(FUSION_CANDIDATES, n_results) if lexical_hits else n_results
+        )
     
-    # Search for similar documents
-    results = collection.query(
-        query_embeddings=query_embedding.tolist(),
-        n_results=n_results
-    )
+    if not lexical_hits:
+        # Return just the document chunks
+        return results['documents'][0][:n_results]
     
-    # Return just the document chunks
-    return results['documents'][0]
+    # Fuse dense and lexical rankings
+    with tracing.span("rank_fusion"):
+        texts = dict(zip(results['ids'][0], results['documents'][0]))
+        fused = reciprocal_rank_fusion([
+            results['ids'][0],
+            [chunk_id for chunk_id, _, _ in lexical_hits]
+        ])[:n_results]
+        # Chunks found only by the bigram index
+        texts.update(fetch_documents([chunk_id for chunk_id in fused if chunk_id not in texts], lexical_index))
+        return [texts[chunk_id] for chunk_id in fused if chunk_id in texts]
 
 if __name__ == "__main__":
     # Test queries
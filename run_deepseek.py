@@ -1,18 +1,25 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, GenerationConfig
-from query_rag import retrieve_relevant_chunks
+import time
+import tracing
+from query_rag import retrieve_relevant_chunks, start_warmup
 
 # Load model once
 MODEL_NAME = "deepseek-ai/deepseek-llm-7b-chat"
 
-def load_model():
-    """Load the model and tokenizer."""
-    print("🤖 Loading DeepSeek model...")
+def load_model(verbose=True):
+    """Load the model and tokenizer (quietly when verbose=False, e.g. behind the prompt)."""
+    # Deferred so the prompt appears before torch/transformers are imported
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    
+    if verbose:
+        print("🤖 Loading DeepSeek model...")
+    load_start = time.perf_counter()
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
     
     # Set device
     device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
-    print(f"🖥️ Using device: {device}")
+    if verbose:
+        print(f"🖥️ Using device: {device}")
     
     # Load model with optimizations and offloading
     model = AutoModelForCausalLM.from_pretrained(
@@ -28,10 +35,11 @@ def load_model():
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
     
+    tracing.add_span("llm_load", time.perf_counter() - load_start)
     return model, tokenizer
 
-def generate_answer(context_chunks, user_query, model, tokenizer):
-    """Generate answer using DeepSeek model."""
+def build_prompt(context_chunks, user_query):
+    """Build the coaching prompt from retrieved chunks and the user's question."""
     # Create context from retrieved chunks
     context = "\n\n".join([f"• {chunk}" for chunk in context_chunks])
     
@@ -45,11 +53,21 @@ def generate_answer(context_chunks, user_query, model, tokenizer):
 {user_query}
 
 【教练QQ的专业回答】"""
+    return prompt
+
+def generate_answer(context_chunks, user_query, model, tokenizer):
+    """Generate answer using DeepSeek model."""
+    import torch
+    
+    with tracing.span("prompt_build"):
+        prompt = build_prompt(context_chunks, user_query)
 
     # Tokenize input
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
+    with tracing.span("tokenize"):
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
     
-    # Generate response
+    # Generate response (prefill and decode are not separable here)
+    generate_start = time.perf_counter()
     with torch.no_grad():
         outputs = model.generate(
             **inputs,
@@ -59,17 +77,26 @@ def generate_answer(context_chunks, user_query, model, tokenizer):
             pad_token_id=tokenizer.eos_token_id,
             eos_token_id=tokenizer.eos_token_id
         )
+    generate_seconds = time.perf_counter() - generate_start
+    
+    prompt_tokens = inputs['input_ids'].shape[1]
+    tracing.add_span("generate", generate_seconds)
+    tracing.record_tokens("deepseek", prompt_tokens, outputs.shape[1] - prompt_tokens, generate_seconds)
     
     # Decode response
-    response = tokenizer.decode(outputs[0][inputs['input_ids'].shape[1]:], skip_special_tokens=True)
+    with tracing.span("detokenize"):
+        response = tokenizer.decode(outputs[0][prompt_tokens:], skip_special_tokens=True)
     return response.strip()
 
 def main():
     """Main function to run the RAG system."""
     print("🚀 Starting DeepSeek RAG System...")
     
-    # Load model
-    model, tokenizer = load_model()
+    tracing.start_metrics_server()
+    
+    # Load the retriever, then the LLM, in one background thread while the prompt is up
+    model_future = start_warmup(then=lambda: load_model(verbose=False))
+    print("⏳ 模型正在后台加载，可以先输入问题")
     
     print("\n" + "="*60)
     print("💬 欢迎使用QQ教练RAG系统！")
@@ -89,20 +116,26 @@ def main():
                 print("❌ 请输入有效问题")
                 continue
             
-            print(f"\n🔍 正在搜索相关内容...")
+            with tracing.request("deepseek"):
+                print(f"\n🔍 正在搜索相关内容...")
             
-            # Retrieve relevant chunks
-            chunks = retrieve_relevant_chunks(query, n_results=3)
+                # Retrieve relevant chunks
+                chunks = retrieve_relevant_chunks(query, n_results=3)
             
-            if not chunks:
-                print("❌ 未找到相关内容")
-                continue
+                if not chunks:
+                    print("❌ 未找到相关内容")
+                    continue
+            
+                print(f"📚 找到 {len(chunks)} 个相关片段")
+                if not model_future.done():
+                    print("⏳ 模型仍在加载，请稍候...")
+                with tracing.span("llm_load_wait"):
+                    model, tokenizer = model_future.result()
             
-            print(f"📚 找到 {len(chunks)} 个相关片段")
-            print("🤖 正在生成回答...")
+                print("🤖 正在生成回答...")
             
-            # Generate answer
-            answer = generate_answer(chunks, query, model, tokenizer)
+                # Generate answer
+                answer = generate_answer(chunks, query, model, tokenizer)
             
             print(f"\n🤖 QQ教练的建议：")
             print("="*60)
@@ -1,14 +1,17 @@
 # run_deepseek_simple.py - Simplified version with smaller model
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from query_rag import retrieve_relevant_chunks
+from query_rag import retrieve_relevant_chunks, start_warmup
 
 # Use a smaller model for testing
 MODEL_NAME = "microsoft/DialoGPT-medium"  # Much smaller model for testing
 
-def load_model():
-    """Load the model and tokenizer."""
-    print("🤖 Loading model...")
+def load_model(verbose=True):
+    """Load the model and tokenizer (quietly when verbose=False, e.g. behind the prompt)."""
+    # Deferred so the prompt appears before torch/transformers are imported
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    
+    if verbose:
+        print("🤖 Loading model...")
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
     model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
     
@@ -20,6 +23,8 @@ def load_model():
 
 def generate_answer(context_chunks, user_query, model, tokenizer):
     """Generate answer using the model."""
+    import torch
+    
     # Create context from retrieved chunks
     context = "\n".join([f"- {chunk[:200]}..." for chunk in context_chunks[:3]])  # Limit context
     
@@ -53,8 +58,9 @@ def main():
     """Main function to run the RAG system."""
     print("🚀 Starting Simple RAG System...")
     
-    # Load model
-    model, tokenizer = load_model()
+    # Load the retriever, then the LLM, in one background thread while the prompt is up
+    model_future = start_warmup(then=lambda: load_model(verbose=False))
+    print("⏳ 模型正在后台加载，可以先输入问题")
     
     print("\n" + "="*60)
     print("💬 欢迎使用QQ教练RAG系统！")
@@ -84,6 +90,10 @@ def main():
                 continue
             
             print(f"📚 找到 {len(chunks)} 个相关片段")
+            if not model_future.done():
+                print("⏳ 模型仍在加载，请稍候...")
+            model, tokenizer = model_future.result()
+            
             print("🤖 正在生成回答...")
             
             # Generate answer
@@ -1,14 +1,16 @@
 # run_ollama_rag.py - RAG system using local Ollama
 import requests
 import json
-from query_rag import retrieve_relevant_chunks
+import time
+import tracing
+from query_rag import retrieve_relevant_chunks, run_in_background, start_warmup
+# Ollama configuration (server URL, model and keep_alive) lives in setup_ollama.py
+from setup_ollama import DEFAULT_MODEL, KEEP_ALIVE, OLLAMA_BASE_URL, ensure_ollama_ready, wait_for_ollama
 
-# Ollama configuration
-OLLAMA_BASE_URL = "http://localhost:11434"
-MODEL_NAME = "deepseek-llm:7b"  # You can change this to any model you have
+READY_TIMEOUT = 10  # Seconds to wait for a server that is still starting up
 
-def generate_answer_with_ollama(context_chunks, user_query):
-    """Generate answer using local Ollama."""
+def build_prompt(context_chunks, user_query):
+    """Build the coaching prompt from retrieved chunks and the user's question."""
     # Create context from retrieved chunks
     context = "\n\n".join([f"• {chunk}" for chunk in context_chunks])
     
@@ -22,21 +24,48 @@ def generate_answer_with_ollama(context_chunks, user_query):
 {user_query}
 
 【教练QQ的专业回答】请基于以上内容给出具体、实用的建议："""
+    return prompt
 
-    # Prepare request for Ollama
-    payload = {
-        "model": MODEL_NAME,
+def record_ollama_timings(result, wall_seconds):
+    """Split one Ollama call into load/queue/prefill/decode spans using its reported durations."""
+    ns = 1e9
+    load = result.get("load_duration", 0) / ns
+    prefill = result.get("prompt_eval_duration", 0) / ns
+    decode = result.get("eval_duration", 0) / ns
+    total = result.get("total_duration", 0) / ns
+    
+    tracing.add_span("ollama_load", load)
+    tracing.add_span("ollama_queue", max(total - load - prefill - decode, 0.0))
+    tracing.add_span("prefill", prefill)
+    tracing.add_span("decode", decode)
+    tracing.add_span("ollama_http", max(wall_seconds - total, 0.0))
+    tracing.record_tokens("ollama", result.get("prompt_eval_count", 0), result.get("eval_count", 0), decode)
+
+def build_payload(prompt, stream=False):
+    """Request body for Ollama's /api/generate."""
+    return {
+        "model": DEFAULT_MODEL,
         "prompt": prompt,
-        "stream": False,
+        "stream": stream,
+        "keep_alive": KEEP_ALIVE,
         "options": {
             "temperature": 0.7,
             "top_p": 0.9,
             "max_tokens": 500
         }
     }
+
+def generate_answer_with_ollama(context_chunks, user_query):
+    """Generate answer using local Ollama."""
+    with tracing.span("prompt_build"):
+        prompt = build_prompt(context_chunks, user_query)
+
+    # Prepare request for Ollama
+    payload = build_payload(prompt, stream=False)
     
     try:
         # Send request to Ollama
+        start = time.perf_counter()
         response = requests.post(
             f"{OLLAMA_BASE_URL}/api/generate",
             json=payload,
@@ -46,23 +75,54 @@ def generate_answer_with_ollama(context_chunks, user_query):
         
         # Parse response
         result = response.json()
+        if tracing.TRACE_ENABLED:
+            record_ollama_timings(result, time.perf_counter() - start)
         return result.get("response", "抱歉，无法生成回答。").strip()
         
     except requests.exceptions.ConnectionError:
+        tracing.fail("connection_error")
         return "❌ 无法连接到Ollama服务。请确保Ollama正在运行。"
     except requests.exceptions.Timeout:
+        tracing.fail("timeout")
         return "❌ 请求超时，请稍后重试。"
     except Exception as e:
+        tracing.fail(type(e).__name__)
         return f"❌ 错误: {str(e)}"
 
-def check_ollama_connection():
-    """Check if Ollama is running and get available models."""
+def stream_answer_with_ollama(context_chunks, user_query, base_url=OLLAMA_BASE_URL, timeout=60):
+    """
+    Stream an answer from Ollama, yielding each response object as it arrives.
+    
+    Every object carries the next piece of text in "response"; the last one has
+    "done": true and Ollama's timing stats. Connection errors are raised to the caller.
+    """
+    prompt = build_prompt(context_chunks, user_query)
+    with requests.post(
+        f"{base_url}/api/generate",
+        json=build_payload(prompt, stream=True),
+        stream=True,
+        timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def check_ollama_connection(preload=False):
+    """Check if Ollama is running and list available models; with preload, also load DEFAULT_MODEL now."""
+    if not wait_for_ollama(OLLAMA_BASE_URL, timeout=READY_TIMEOUT):
+        print("❌ 无法连接到Ollama。请确保Ollama正在运行：")
+        print("   ollama serve")
+        return False
+    
     try:
         response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
         if response.status_code == 200:
             models = response.json().get("models", [])
             print(f"✅ Ollama连接成功！")
             print(f"📋 可用模型: {[model['name'] for model in models]}")
+            if preload:
+                return ensure_ollama_ready(DEFAULT_MODEL, KEEP_ALIVE, OLLAMA_BASE_URL)
             return True
         else:
             print(f"❌ Ollama响应错误: {response.status_code}")
@@ -75,15 +135,35 @@ def check_ollama_connection():
         print(f"❌ 连接Ollama时出错: {e}")
         return False
 
+def start_ollama_warmup():
+    """
+    Preload DEFAULT_MODEL and run a warmup generation in the background.
+    
+    Same routine as check_ollama_connection(preload=True), but the prompt does not
+    wait for the model load; the first question waits only if it is still running.
+    """
+    return run_in_background(
+        lambda: ensure_ollama_ready(DEFAULT_MODEL, KEEP_ALIVE, OLLAMA_BASE_URL, verbose=False),
+        name="ollama-warmup"
+    )
+
 def main():
     """Main function to run the RAG system."""
     print("🚀 Starting Ollama RAG System...")
     
+    tracing.start_metrics_server()
+    
+    # Load the embedding model and vector store in the background
+    start_warmup()
+    
     # Check Ollama connection
     if not check_ollama_connection():
         return
     
-    print(f"🤖 使用模型: {MODEL_NAME}")
+    # Pay the model load behind the prompt so the first answer is at steady-state latency
+    ollama_ready = start_ollama_warmup()
+    
+    print(f"🤖 使用模型: {DEFAULT_MODEL}")
     print("\n" + "="*60)
     print("💬 欢迎使用QQ教练RAG系统！")
     print("💡 输入 'quit' 或 'exit' 退出")
@@ -102,20 +182,26 @@ def main():
                 print("❌ 请输入有效问题")
                 continue
             
-            print(f"\n🔍 正在搜索相关内容...")
+            with tracing.request("ollama"):
+                print(f"\n🔍 正在搜索相关内容...")
             
-            # Retrieve relevant chunks
-            chunks = retrieve_relevant_chunks(query, n_results=3)
+                # Retrieve relevant chunks
+                chunks = retrieve_relevant_chunks(query, n_results=3)
             
-            if not chunks:
-                print("❌ 未找到相关内容")
-                continue
+                if not chunks:
+                    print("❌ 未找到相关内容")
+                    continue
             
-            print(f"📚 找到 {len(chunks)} 个相关片段")
-            print("🤖 正在生成回答...")
+                print(f"📚 找到 {len(chunks)} 个相关片段")
+                if not ollama_ready.done():
+                    print("⏳ 模型仍在加载，请稍候...")
+                with tracing.span("llm_warmup_wait"):
+                    ollama_ready.result()
+                
+                print("🤖 正在生成回答...")
             
-            # Generate answer
-            answer = generate_answer_with_ollama(chunks, query)
+                # Generate answer
+                answer = generate_answer_with_ollama(chunks, query)
             
             print(f"\n🤖 QQ教练的建议：")
             print("="*60)
@@ -3,6 +3,10 @@ import requests
 import subprocess
 import time
 
+OLLAMA_BASE_URL = "http://localhost:11434"
+DEFAULT_MODEL = "deepseek-llm:7b"  # Model used by run_ollama_rag.py; you can change this to any model you have
+KEEP_ALIVE = "30m"  # How long Ollama keeps the model in memory after the last request ("-1" = forever)
+
 def check_ollama_installed():
     """Check if Ollama is installed."""
     try:
@@ -17,25 +21,101 @@ def check_ollama_installed():
         print("❌ Ollama未安装。请访问 https://ollama.ai 下载安装")
         return False
 
+def wait_for_ollama(base_url=OLLAMA_BASE_URL, timeout=30.0, initial_delay=0.1, max_delay=2.0):
+    """Poll the Ollama API with exponential backoff until it answers or `timeout` seconds pass."""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            response = requests.get(f"{base_url}/api/tags", timeout=2)
+            if response.status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+def preload_model(model=DEFAULT_MODEL, keep_alive=KEEP_ALIVE, base_url=OLLAMA_BASE_URL, timeout=300):
+    """
+    Load a model into memory and keep it resident for `keep_alive`.
+    
+    A generate request without a prompt only loads the model, so this pays the
+    load cost up front instead of on the first real question.
+    """
+    response = requests.post(
+        f"{base_url}/api/generate",
+        json={"model": model, "keep_alive": keep_alive},
+        timeout=timeout
+    )
+    if response.status_code == 404:
+        print(f"❌ 模型 {model} 未下载，请运行: ollama pull {model}")
+        return False
+    response.raise_for_status()
+    return True
+
+def warmup_generation(model=DEFAULT_MODEL, keep_alive=KEEP_ALIVE, base_url=OLLAMA_BASE_URL, timeout=120, verbose=True):
+    """Run a one-token generation to verify the model answers at steady-state latency."""
+    start = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/generate",
+        json={
+            "model": model,
+            "prompt": "你好",
+            "stream": False,
+            "keep_alive": keep_alive,
+            "options": {"num_predict": 1}
+        },
+        timeout=timeout
+    )
+    response.raise_for_status()
+    result = response.json()
+    elapsed = time.perf_counter() - start
+    if not result.get("done"):
+        return False
+    if verbose:
+        print(f"🔥 模型预热完成 ({elapsed:.2f}s)")
+    return True
+
+def ensure_ollama_ready(model=DEFAULT_MODEL, keep_alive=KEEP_ALIVE, base_url=OLLAMA_BASE_URL, timeout=30.0, verbose=True):
+    """
+    Wait for the server, preload `model` with `keep_alive`, and verify it with a warmup generation.
+    
+    With verbose=False only failures are printed, so it can run behind a prompt.
+    """
+    if not wait_for_ollama(base_url, timeout=timeout):
+        print(f"❌ Ollama在{timeout:.0f}秒内未就绪")
+        return False
+    
+    if verbose:
+        print(f"📥 预加载模型 {model} (keep_alive={keep_alive})...")
+    try:
+        if not preload_model(model, keep_alive, base_url):
+            return False
+        if not warmup_generation(model, keep_alive, base_url, verbose=verbose):
+            print("❌ 模型预热失败")
+            return False
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 预加载模型时出错: {e}")
+        return False
+    return True
+
 def start_ollama_server():
     """Start Ollama server if not running."""
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
-        if response.status_code == 200:
-            print("✅ Ollama服务已在运行")
-            return True
-    except:
-        pass
+    if wait_for_ollama(timeout=0):
+        print("✅ Ollama服务已在运行")
+        return True
     
     print("🚀 启动Ollama服务...")
     try:
         # Start Ollama server in background
         subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(3)  # Wait for server to start
         
-        # Check if it's running
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
+        # Poll until it answers instead of sleeping a fixed amount
+        if wait_for_ollama():
             print("✅ Ollama服务启动成功")
             return True
         else:
@@ -48,7 +128,7 @@ def start_ollama_server():
 def get_available_models():
     """Get list of available models."""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [model["name"] for model in models]
@@ -96,6 +176,8 @@ def main():
     models = get_available_models()
     if models:
         print(f"\n📋 当前可用模型: {models}")
+        if DEFAULT_MODEL in models:
+            ensure_ollama_ready(DEFAULT_MODEL)
     else:
         print("\n📋 暂无模型，需要下载")
     
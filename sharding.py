@@ -0,0 +1,105 @@
+# sharding.py - Split the notes corpus across multiple Chroma collections
+import zlib
+
+COLLECTION_NAME = "notes"
+NUM_SHARDS = 1  # 1 keeps everything in the single "notes" collection
+SHARD_BY = "source"  # "source": whole documents per shard, "hash": spread chunks by ID
+SEARCH_WORKERS = 8  # Thread pool size for fanning queries out to the shards
+
+def shard_name(index, num_shards=NUM_SHARDS):
+    """Return the collection name for shard `index`."""
+    if num_shards <= 1:
+        return COLLECTION_NAME
+    return f"{COLLECTION_NAME}-shard-{index:03d}"
+
+def layout_shard_names(num_shards=NUM_SHARDS):
+    """Collection names that make up the corpus for a given shard count."""
+    return [shard_name(i, num_shards) for i in range(max(num_shards, 1))]
+
+def is_shard_name(name):
+    """Whether a collection name belongs to the notes corpus."""
+    return name == COLLECTION_NAME or name.startswith(f"{COLLECTION_NAME}-shard-")
+
+def stable_hash(key):
+    """Hash a string the same way across processes (unlike built-in hash())."""
+    return zlib.crc32(key.encode("utf-8"))
+
+def source_key(source):
+    """Short stable prefix used to make chunk IDs unique per source document."""
+    return f"{stable_hash(source):08x}"
+
+def shard_for(source, chunk_id, num_shards=NUM_SHARDS, shard_by=SHARD_BY):
+    """Pick the shard index for a chunk."""
+    if num_shards <= 1:
+        return 0
+    if shard_by == "source":
+        key = source
+    elif shard_by == "hash":
+        key = chunk_id
+    else:
+        raise ValueError(f"Unknown shard_by: {shard_by!r} (expected 'source' or 'hash')")
+    return stable_hash(key) % num_shards
+
+def layout_metadata(num_shards=NUM_SHARDS, shard_by=SHARD_BY):
+    """Collection metadata recording the shard layout a collection was written with."""
+    return {"layout:num_shards": num_shards, "layout:shard_by": shard_by}
+
+def list_shard_names(client):
+    """List the notes collections that exist in a Chroma client, sorted by name."""
+    names = []
+    for collection in client.list_collections():
+        # Older chromadb versions return names, newer ones Collection objects
+        name = getattr(collection, "name", collection)
+        if is_shard_name(name):
+            names.append(name)
+    return sorted(names)
+
+def stored_layout(client):
+    """
+    Return the (num_shards, shard_by) layout recorded in a store, or None if it has no notes collections.
+
+    Collections written before the layout was recorded are assumed to follow
+    NUM_SHARDS/SHARD_BY (a lone "notes" collection is always the 1-shard layout).
+    A store mixing several layouts raises, since searching it would return
+    duplicate or missing chunks.
+    """
+    layouts = set()
+    for name in list_shard_names(client):
+        metadata = client.get_collection(name).metadata or {}
+        default_count = 1 if name == COLLECTION_NAME else NUM_SHARDS
+        layouts.add((
+            metadata.get("layout:num_shards", default_count),
+            metadata.get("layout:shard_by", SHARD_BY)
+        ))
+    if not layouts:
+        return None
+    if len(layouts) > 1:
+        raise RuntimeError(f"Store mixes shard layouts {sorted(layouts)}; delete it and re-ingest to reshard")
+    return layouts.pop()
+
+def merge_top_k(shard_results, k):
+    """
+    Merge per-shard `collection.query` results into a global top-k by distance.
+
+    Returns a dict in the same single-query shape Chroma uses
+    (e.g. results['documents'][0]), so callers need not know about shards.
+    """
+    hits = []
+    for results in shard_results:
+        for doc, distance, metadata, chunk_id in zip(
+            results['documents'][0],
+            results['distances'][0],
+            results['metadatas'][0],
+            results['ids'][0]
+        ):
+            hits.append((distance, doc, metadata, chunk_id))
+
+    hits.sort(key=lambda hit: hit[0])
+    hits = hits[:k]
+
+    return {
+        'documents': [[hit[1] for hit in hits]],
+        'distances': [[hit[0] for hit in hits]],
+        'metadatas': [[hit[2] for hit in hits]],
+        'ids': [[hit[3] for hit in hits]],
+    }
@@ -0,0 +1,244 @@
+# tracing.py - Per-stage latency spans and Prometheus-style metrics for the RAG loop
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Tracing is off unless RAG_TRACE=1; when off, span() and request() return shared no-ops
+TRACE_ENABLED = os.environ.get("RAG_TRACE") == "1"
+TRACE_FILE = os.environ.get("RAG_TRACE_FILE", "rag_trace.jsonl")
+METRICS_PORT = int(os.environ.get("RAG_METRICS_PORT", "0"))  # 0 = no /metrics endpoint
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (str(bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + ('+Inf',))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+REQUESTS = Counter("rag_requests_total", "Questions answered", ("frontend", "status"))
+TOKENS = Counter("rag_tokens_total", "Tokens processed by the LLM", ("frontend", "kind"))
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent per pipeline stage", ("stage",))
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end time per question", ("frontend",))
+TOKENS_PER_SECOND = Histogram(
+    "rag_decode_tokens_per_second", "Decode throughput per question", ("frontend",),
+    buckets=TOKENS_PER_SECOND_BUCKETS
+)
+METRICS = (REQUESTS, TOKENS, STAGE_SECONDS, REQUEST_SECONDS, TOKENS_PER_SECOND)
+
+_lock = threading.Lock()
+_local = threading.local()
+_request_ids = itertools.count(1)
+
+class _NoopTrace:
+    """Stand-in returned when tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def fail(self, reason):
+        pass
+
+_NOOP = _NoopTrace()
+
+class _Trace:
+    """Spans and attributes collected for one question."""
+
+    def __init__(self, frontend):
+        self.frontend = frontend
+        self.record = {
+            "type": "request",
+            "request_id": next(_request_ids),
+            "frontend": frontend,
+            "start_time": time.time(),
+            "spans": [],
+            "attributes": {}
+        }
+        self.error = None
+
+    def set(self, key, value):
+        self.record["attributes"][key] = value
+
+    def fail(self, reason):
+        """Count the question as an error even though no exception escaped."""
+        self.error = reason
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        _local.trace = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.trace = None
+        elapsed = time.perf_counter() - self._start
+        if exc_type and self.error is None:
+            self.error = exc_type.__name__
+        status = "error" if self.error else "ok"
+        self.record["duration_s"] = elapsed
+        self.record["status"] = status
+        if self.error:
+            self.record["error"] = self.error
+        with _lock:
+            REQUESTS.inc(frontend=self.frontend, status=status)
+            REQUEST_SECONDS.observe(elapsed, frontend=self.frontend)
+        _write(self.record)
+        return False
+
+def request(frontend):
+    """Context manager wrapping one question; spans inside it are grouped into one JSON line."""
+    if not TRACE_ENABLED:
+        return _NOOP
+    return _Trace(frontend)
+
+def fail(reason):
+    """Mark the current question as failed, e.g. when an error is shown to the user as the answer."""
+    if not TRACE_ENABLED:
+        return
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.fail(reason)
+
+def add_span(stage, seconds, **attributes):
+    """Record a stage whose duration was measured elsewhere (e.g. reported by Ollama)."""
+    if not TRACE_ENABLED:
+        return
+    span = {"stage": stage, "duration_s": seconds}
+    if attributes:
+        span.update(attributes)
+    with _lock:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.record["spans"].append(span)
+    else:
+        # Background work such as model loading happens outside any question
+        _write(dict(span, type="span", start_time=time.time() - seconds))
+
+@contextmanager
+def _timed_span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(stage, time.perf_counter() - start)
+
+def span(stage):
+    """Context manager timing one pipeline stage."""
+    if not TRACE_ENABLED:
+        return _NOOP
+    return _timed_span(stage)
+
+def record_tokens(frontend, prompt_tokens, completion_tokens, decode_seconds=None):
+    """Count prompt/completion tokens and, if the decode time is known, tokens/sec."""
+    if not TRACE_ENABLED:
+        return
+    with _lock:
+        TOKENS.inc(prompt_tokens, frontend=frontend, kind="prompt")
+        TOKENS.inc(completion_tokens, frontend=frontend, kind="completion")
+        if decode_seconds:
+            TOKENS_PER_SECOND.observe(completion_tokens / decode_seconds, frontend=frontend)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.set("prompt_tokens", prompt_tokens)
+        trace.set("completion_tokens", completion_tokens)
+        if decode_seconds:
+            trace.set("tokens_per_second", completion_tokens / decode_seconds)
+
+def _write(record):
+    line = json.dumps(record, ensure_ascii=False)
+    with _lock:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+def metrics_text():
+    """Render all metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = []
+        for metric in METRICS:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on `port` from a daemon thread (no-op when tracing is off or port is 0)."""
+    if not TRACE_ENABLED or not port:
+        return None
+    server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics available at http://127.0.0.1:{port}/metrics")
+    return server
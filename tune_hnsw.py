@@ -0,0 +1,192 @@
+# tune_hnsw.py - Measure HNSW recall against latency for the stored embeddings
+import argparse
+import itertools
+import random
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from embed_store import DB_DIR, HNSW_SPACE, hnsw_metadata, set_search_ef
+from sharding import list_shard_names
+
+DEFAULT_M = [8, 16, 32]
+DEFAULT_CONSTRUCTION_EF = [100, 200]
+DEFAULT_SEARCH_EF = [10, 25, 50, 100, 200]
+
+def load_stored_embeddings(db_dir=DB_DIR):
+    """Load every chunk ID and embedding from all notes shards."""
+    client = chromadb.PersistentClient(path=db_dir)
+    ids = []
+    embeddings = []
+    for name in list_shard_names(client):
+        data = client.get_collection(name).get(include=["embeddings"])
+        ids.extend(data["ids"])
+        embeddings.extend(data["embeddings"])
+    return ids, np.asarray(embeddings, dtype=np.float32)
+
+def encode_queries(path):
+    """Encode one query per line from a text file with the retrieval model."""
+    from query_rag import get_embedder
+    with open(path, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    return np.asarray(get_embedder().encode(queries), dtype=np.float32)
+
+def brute_force_neighbours(embeddings, queries, k, space=HNSW_SPACE):
+    """Exact top-k neighbour indexes under the index's distance function (the ground truth)."""
+    def normalize(x):
+        return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+    # Higher score = closer, matching Chroma's distance for each space
+    if space == "cosine":
+        scores = normalize(queries) @ normalize(embeddings).T
+    elif space == "ip":
+        scores = queries @ embeddings.T
+    elif space == "l2":
+        # -||q - e||^2 without the per-query ||q||^2 term, which does not change the ranking
+        scores = 2 * queries @ embeddings.T - np.sum(embeddings ** 2, axis=1)
+    else:
+        raise ValueError(f"Unknown HNSW space: {space!r} (expected 'cosine', 'ip' or 'l2')")
+    k = min(k, embeddings.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def build_index(client, embeddings, m, construction_ef):
+    """Build a scratch collection with the given HNSW settings; return it and the build time."""
+    name = f"tune-m{m}-c{construction_ef}"
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(
+        name=name,
+        metadata=hnsw_metadata(HNSW_SPACE, construction_ef, m=m)
+    )
+
+    ids = [str(i) for i in range(len(embeddings))]
+    batch_size = client.get_max_batch_size() if hasattr(client, "get_max_batch_size") else 5000
+
+    start = time.perf_counter()
+    for offset in range(0, len(ids), batch_size):
+        collection.add(
+            ids=ids[offset:offset + batch_size],
+            embeddings=embeddings[offset:offset + batch_size].tolist()
+        )
+    build_seconds = time.perf_counter() - start
+    return collection, build_seconds
+
+def reopen_with_search_ef(client, path, collection, search_ef, warmup_query):
+    """
+    Set search_ef and reopen the collection so queries use it; return the new client and collection.
+
+    Chroma keeps a loaded index at the ef it was loaded with, so the change only
+    applies after the client cache is cleared and the collection is read back.
+    """
+    set_search_ef(collection, search_ef)
+    client.clear_system_cache()
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_collection(collection.name)
+    # Load the index from disk before anything is timed
+    collection.query(query_embeddings=[warmup_query.tolist()], n_results=1)
+    return client, collection
+
+def evaluate(collection, queries, ground_truth, k):
+    """Run each query on its own; return mean recall@k and per-query latencies in ms."""
+    recalls = []
+    latencies = []
+    for query, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        results = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(i) for i in results["ids"][0]}
+        recalls.append(len(found & truth) / len(truth))
+    return sum(recalls) / len(recalls), latencies
+
+def sweep(embeddings, queries, k, m_values, construction_efs, search_efs):
+    """Build an index per (M, construction_ef), query it at each search_ef and print recall@k against latency."""
+    print(f"🎯 Computing exact {HNSW_SPACE} ground truth for {len(queries)} queries over {len(embeddings)} vectors...")
+    ground_truth = brute_force_neighbours(embeddings, queries, k, HNSW_SPACE)
+
+    # Scratch store in a temporary directory so the real chroma_store is never modified.
+    # It is on disk (not EphemeralClient) so a collection can be reopened with a new search_ef.
+    scratch = tempfile.TemporaryDirectory(prefix="tune_hnsw_")
+    client = chromadb.PersistentClient(path=scratch.name)
+    rows = []
+
+    print(f"\n{'M':>4} {'constr_ef':>10} {'search_ef':>10} {f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    print("-" * 64)
+    for m, construction_ef in itertools.product(m_values, construction_efs):
+        # search_ef does not affect the graph, so one build serves every search_ef
+        collection, build_seconds = build_index(client, embeddings, m, construction_ef)
+        for i, search_ef in enumerate(search_efs):
+            client, collection = reopen_with_search_ef(client, scratch.name, collection, search_ef, queries[0])
+            recall, latencies = evaluate(collection, queries, ground_truth, k)
+
+            row = {
+                "M": m,
+                "construction_ef": construction_ef,
+                "search_ef": search_ef,
+                "recall": recall,
+                "p50_ms": percentile(latencies, 50),
+                "p99_ms": percentile(latencies, 99),
+                "build_s": build_seconds
+            }
+            rows.append(row)
+            build_column = f"{build_seconds:>8.2f}" if i == 0 else f"{'':>8}"
+            print(f"{m:>4} {construction_ef:>10} {search_ef:>10} {recall:>10.4f} "
+                  f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {build_column}")
+        client.delete_collection(collection.name)
+
+    client.clear_system_cache()
+    scratch.cleanup()
+    return rows
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep HNSW settings and report recall@k vs. latency")
+    parser.add_argument("--db_dir", default=DB_DIR, help="Chroma store to read embeddings from")
+    parser.add_argument("--queries", help="Text file with one query per line (default: sample stored chunks)")
+    parser.add_argument("--num_queries", type=int, default=200, help="Number of stored chunks to sample as queries")
+    parser.add_argument("-k", type=int, default=5, help="Neighbours per query (recall@k)")
+    parser.add_argument("--m", type=parse_int_list, default=DEFAULT_M)
+    parser.add_argument("--construction_ef", type=parse_int_list, default=DEFAULT_CONSTRUCTION_EF)
+    parser.add_argument("--search_ef", type=parse_int_list, default=DEFAULT_SEARCH_EF)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"📖 Loading embeddings from {args.db_dir}...")
+    _, embeddings = load_stored_embeddings(args.db_dir)
+    if len(embeddings) == 0:
+        print("❌ No embeddings found. Run embed_store.py first.")
+        return
+
+    if args.queries:
+        queries = encode_queries(args.queries)
+    else:
+        # Stored chunks stand in for queries. They are held out of the index being
+        # searched: left in, each query would be its own exact nearest neighbour and
+        # fill one of the k slots for free, overstating recall most at small k.
+        if len(embeddings) < 2:
+            print("❌ Need at least 2 stored chunks to hold some out as queries.")
+            return
+        rng = random.Random(args.seed)
+        sample = rng.sample(range(len(embeddings)), min(args.num_queries, len(embeddings) // 2))
+        queries = embeddings[sample]
+        embeddings = np.delete(embeddings, sample, axis=0)
+
+    sweep(embeddings, queries, args.k, args.m, args.construction_ef, args.search_ef)
+    print("\n💡 Set the chosen values as HNSW_* in embed_store.py. A new search_ef is applied to existing")
+    print("   collections the next time embed_store.py runs; a new M or construction_ef needs the")
+    print("   collections dropped (drop_shard) and the sources re-ingested.")
+
+if __name__ == "__main__":
+    main()